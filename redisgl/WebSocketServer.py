@@ -140,25 +140,20 @@ class WebSocketServer:
         else:
             b1 |= 0b00000010
 
-        # Send text data
-        encoded_bytes = struct.pack("!B", b1)
-
-        # Encode message length
+        # Encode header with message length
         length = len(message)
         if length < 126:
             b2 = length
-            encoded_bytes += struct.pack("!B", b2)  # byte
+            header = struct.pack("!BB", b1, b2)  # byte, byte
         elif length < (2**16) - 1:
             b2 = 126
-            encoded_bytes += struct.pack("!BH", b2, length)  # byte, short
+            header = struct.pack("!BBH", b1, b2, length)  # byte, byte, short
         else:
             b2 = 127
-            encoded_bytes += struct.pack("!BQ", b2, length)  # byte, long long
+            header = struct.pack("!BBQ", b1, b2, length)  # byte, byte, long long
 
         # Append encoded_bytes
-        encoded_bytes += message
-
-        return encoded_bytes
+        return header + message
 
     @staticmethod
     def encode_message(message):
@@ -172,17 +167,17 @@ class WebSocketServer:
         elif type(message) is str:
             message = message.encode("utf-8")
         else:
-            update_message = struct.pack("!L", len(message["update"]))  # long
+            # Collect the frames and join them once to avoid quadratic copying.
+            frames = [struct.pack("!L", len(message["update"]))]  # long
             for key, val in message["update"]:
-                update_message += WebSocketServer.encode_bytes(
-                    key
-                ) + WebSocketServer.encode_bytes(val)
+                frames.append(WebSocketServer.encode_bytes(key))
+                frames.append(WebSocketServer.encode_bytes(val))
 
-            delete_message = struct.pack("!L", len(message["delete"]))  # long
+            frames.append(struct.pack("!L", len(message["delete"])))  # long
             for key in message["delete"]:
-                delete_message += WebSocketServer.encode_bytes(key)
+                frames.append(WebSocketServer.encode_bytes(key))
 
-            message = update_message + delete_message
+            message = b"".join(frames)
 
         return WebSocketServer.encode_bytes(message)
 
@@ -15,8 +15,10 @@ class Pose:
         quat: xyzw quaternion.
     """
 
-    pos: np.ndarray = np.zeros(3)
-    quat: np.ndarray = np.array([0.0, 0.0, 0.0, 1.0])
+    pos: np.ndarray = dataclasses.field(default_factory=lambda: np.zeros(3))
+    quat: np.ndarray = dataclasses.field(
+        default_factory=lambda: np.array([0.0, 0.0, 0.0, 1.0])
+    )
 
     def to_dict(self) -> Dict[str, Any]:
         """Converts a pose to dict format."""
@@ -126,8 +128,8 @@ class Material:
 class Graphics:
     name: str
     geometry: Geometry
-    material: Material = Material()
-    T_to_parent: Pose = Pose()
+    material: Material = dataclasses.field(default_factory=Material)
+    T_to_parent: Pose = dataclasses.field(default_factory=Pose)
 
     def to_dict(self) -> Dict:
         return {
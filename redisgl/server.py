@@ -8,7 +8,7 @@ Authors: Toki Migimatsu
 """
 import json
 import os
-import shutil
+import queue
 import threading
 from http.server import HTTPServer
 from multiprocessing import Process, Queue
@@ -16,47 +16,142 @@ from multiprocessing import Process, Queue
 from .HTTPRequestHandler import makeHTTPRequestHandler
 from .WebSocketServer import WebSocketServer
 
+WEB_DIRECTORY = os.path.join(os.path.dirname(__file__), "web")
 
-def handle_get_request(request_handler, get_vars, **kwargs):
+# Contents of static files served so far, keyed by path.
+_file_cache = {}
+
+
+def _read_static_file(path):
     """
-    HTTPRequestHandler callback:
+    Read a static file, hitting the disk only the first time it is requested.
 
-    Serve content inside WEB_DIRECTORY
+    Returns None if the file does not exist.
     """
-    WEB_DIRECTORY = os.path.join(os.path.dirname(__file__), "web")
+    contents = _file_cache.get(path)
+    if contents is None and os.path.isfile(path):
+        with open(path, "rb") as f:
+            contents = f.read()
+        _file_cache[path] = contents
+    return contents
 
-    path_tokens = [token for token in request_handler.path.split("/") if token]
 
+def _send_static_file(request_handler, request_path):
+    """
+    Send a file inside WEB_DIRECTORY, or a 404 error if it does not exist.
+    """
+    # print("REQUEST_PATH", request_path)
+    contents = None if request_path is None else _read_static_file(request_path)
+    if contents is None:
+        # print(request_handler.path, request_path)
+        request_handler.send_error(404, "File not found.")
+        return
+
+    # Otherwise send file directly
+    request_handler.wfile.write(contents)
+
+
+def _get_static(request_handler, path_tokens, **kwargs):
     # Default to index.html
-    request_path = None
-    if not path_tokens or ".." in path_tokens:
+    if not path_tokens:
         request_path = os.path.join(WEB_DIRECTORY, "simulator.html")
-    elif path_tokens[0] == "get_websocket_port":
-        request_handler.wfile.write(str(kwargs["ws_port"]).encode("utf-8"))
-        ui_requests = kwargs["ui_requests"]
-        ui_requests.put(("WebServer.on_connect",))
-        return
-    elif len(path_tokens) > 2 and path_tokens[0] == "resources":
-        path_resources = [f"{WEB_DIRECTORY}/resources".encode("utf-8")]
-        for path_resource in path_resources:
-            request_path = os.path.join(path_resource.decode("utf-8"), *path_tokens[1:])
-            if os.path.isfile(request_path):
-                break
-            request_path = None
     else:
         request_path = os.path.join(WEB_DIRECTORY, *path_tokens)
+    _send_static_file(request_handler, request_path)
+
+
+def _get_websocket_port(request_handler, path_tokens, **kwargs):
+    request_handler.wfile.write(str(kwargs["ws_port"]).encode("utf-8"))
+    ui_requests = kwargs["ui_requests"]
+    ui_requests.put(("WebServer.on_connect",))
+
+
+def _get_resources(request_handler, path_tokens, **kwargs):
+    if len(path_tokens) <= 2:
+        _get_static(request_handler, path_tokens, **kwargs)
+        return
+
+    request_path = None
+    path_resources = [f"{WEB_DIRECTORY}/resources".encode("utf-8")]
+    for path_resource in path_resources:
+        request_path = os.path.join(path_resource.decode("utf-8"), *path_tokens[1:])
+        if request_path in _file_cache or os.path.isfile(request_path):
+            break
+        request_path = None
+    _send_static_file(request_handler, request_path)
+
+
+def _post_del(request_handler, post_vars, **kwargs):
+    keys = [key for key, _ in post_vars.items()]
+    if not keys:
+        return
+    if type(keys[0]) is bytes:
+        keys = [k.decode("utf-8") for k in keys]
+
+    # result = kwargs["redis_db"].delete(*keys)
+    # print("DEL {}: {}".format(" ".join(keys), result))
+
+
+def _post_set(request_handler, post_vars, **kwargs):
+    for key, val_str in post_vars.items():
+        if type(key) is bytes:
+            key = key.decode("utf-8")
+
+        if type(val_str[0]) is bytes:
+            val_json = json.loads(val_str[0].decode("utf-8"))
+        else:
+            val_json = json.loads(val_str[0])
+
+        try:
+            types = (str, unicode)  # type: ignore
+        except:
+            types = (str,)
+
+        if type(val_json) in types:
+            val = val_json
+        elif type(val_json) is dict:
+            val = json.dumps(val_json)
+        else:
+            val = "; ".join(" ".join(map(str, row)) for row in val_json)
+        # print("%s: %s" % (key, val))
+        ui_requests = kwargs["ui_requests"]
+        ui_requests.put(("WebServer.on_update", key, val))
+        # kwargs["redis_db"].set(key, val)
+
+
+def _post_ready(request_handler, post_vars, **kwargs):
+    keys = list(post_vars)
+    ui_requests = kwargs["ui_requests"]
+    ui_requests.put(("WebServer.on_ready", keys[0]))
+
+
+# Handlers keyed by the first token of the request path.
+GET_HANDLERS = {
+    "get_websocket_port": _get_websocket_port,
+    "resources": _get_resources,
+}
+POST_HANDLERS = {
+    "DEL": _post_del,
+    "SET": _post_set,
+    "READY": _post_ready,
+}
+
+
+def handle_get_request(request_handler, get_vars, **kwargs):
+    """
+    HTTPRequestHandler callback:
+
+    Serve content inside WEB_DIRECTORY
+    """
+    path_tokens = [token for token in request_handler.path.split("/") if token]
     # print("PATH_TOKENS", path_tokens)
-    # print("REQUEST_PATH", request_path)
 
-    # Check if file exists
-    if request_path is None or not os.path.isfile(request_path):
-        # print(request_handler.path, request_path)
-        request_handler.send_error(404, "File not found.")
+    if not path_tokens or ".." in path_tokens:
+        _get_static(request_handler, [], **kwargs)
         return
 
-    # Otherwise send file directly
-    with open(request_path, "rb") as f:
-        shutil.copyfileobj(f, request_handler.wfile)
+    handler = GET_HANDLERS.get(path_tokens[0], _get_static)
+    handler(request_handler, path_tokens, **kwargs)
 
 
 def handle_post_request(request_handler, post_vars, **kwargs):
@@ -69,46 +164,10 @@ def handle_post_request(request_handler, post_vars, **kwargs):
 
     if not path_tokens or ".." in path_tokens:
         return
-    if path_tokens[0] == "DEL":
-        keys = [key for key, _ in post_vars.items()]
-        if not keys:
-            return
-        if type(keys[0]) is bytes:
-            keys = [k.decode("utf-8") for k in keys]
-
-        # result = kwargs["redis_db"].delete(*keys)
-        # print("DEL {}: {}".format(" ".join(keys), result))
-
-    elif path_tokens[0] == "SET":
-        for key, val_str in post_vars.items():
-            if type(key) is bytes:
-                key = key.decode("utf-8")
-
-            if type(val_str[0]) is bytes:
-                val_json = json.loads(val_str[0].decode("utf-8"))
-            else:
-                val_json = json.loads(val_str[0])
-
-            try:
-                types = (str, unicode)  # type: ignore
-            except:
-                types = (str,)
-
-            if type(val_json) in types:
-                val = val_json
-            elif type(val_json) is dict:
-                val = json.dumps(val_json)
-            else:
-                val = "; ".join(" ".join(map(str, row)) for row in val_json)
-            # print("%s: %s" % (key, val))
-            ui_requests = kwargs["ui_requests"]
-            ui_requests.put(("WebServer.on_update", key, val))
-            # kwargs["redis_db"].set(key, val)
-
-    elif path_tokens[0] == "READY":
-        keys = list(post_vars)
-        ui_requests = kwargs["ui_requests"]
-        ui_requests.put(("WebServer.on_ready", keys[0]))
+
+    handler = POST_HANDLERS.get(path_tokens[0])
+    if handler is not None:
+        handler(request_handler, post_vars, **kwargs)
 
 
 def run_http_server(http_port, ws_port, ui_requests, verbose: bool):
@@ -130,10 +189,18 @@ class WebServer:
     def __init__(self):
         self._ui_requests = Queue()
         self._db = {}
-        self._key_vals = []
+        self._dirty_keys = set()
         self._del_keys = []
         self._callback_fns = {}
 
+        # Outgoing message queue of each connected client, drained by a
+        # per-client sender thread so that no socket I/O happens under _lock.
+        self._client_queues = {}
+
+        # Guards _db, _dirty_keys, _del_keys, and _client_queues, which the
+        # simulation thread writes while WebSocket threads read them.
+        self._lock = threading.Lock()
+
     def connect(self, http_port=8000, ws_port=8001, verbose: bool = True):
         # Create RedisMonitor, HTTPServer, and WebSocketServer
         if verbose:
@@ -158,7 +225,8 @@ class WebServer:
         # Start WebSocketServer
         # ws_server_thread = threading.Thread(target=ws_server.serve_forever, args=(redis_monitor.initialize_client,))
         ws_server_thread = threading.Thread(
-            target=self.ws_server.serve_forever, args=(self._initialize_client,)
+            target=self.ws_server.serve_forever,
+            args=(self._initialize_client, self._on_client_message),
         )
         ws_server_thread.daemon = True
         ws_server_thread.start()
@@ -172,8 +240,11 @@ class WebServer:
         # redis_monitor.run_forever(ws_server)
 
     def set(self, key, val, commit=False):
-        self._key_vals.append((key, val))
-        self._db[key] = val
+        with self._lock:
+            # Only mark the key for sending if its value actually changed.
+            if key not in self._db or self._db[key] != val:
+                self._db[key] = val
+                self._dirty_keys.add(key)
         if commit:
             self.commit()
 
@@ -181,20 +252,30 @@ class WebServer:
         self.set(key, " ".join(map(str, val)), commit)
 
     def delete(self, key):
-        self._del_keys.append(key)
-        del self._db[key]
+        with self._lock:
+            self._del_keys.append(key)
+            self._dirty_keys.discard(key)
+            del self._db[key]
 
     def commit(self):
-        self.ws_server.lock.acquire()
-        for client in self.ws_server.clients:
-            client.send(
-                self.ws_server.encode_message(
-                    {"update": self._key_vals, "delete": self._del_keys}
-                )
-            )
-        self.ws_server.lock.release()
-        self._key_vals.clear()
-        self._del_keys.clear()
+        # Collect pending changes and the clients to send them to under one
+        # lock, which new clients also hold while they copy the database and
+        # register. Every change thus reaches every client exactly once.
+        with self._lock:
+            dirty_keys, self._dirty_keys = self._dirty_keys, set()
+            del_keys, self._del_keys = self._del_keys, []
+            key_vals = [(key, self._db[key]) for key in dirty_keys]
+            send_queues = list(self._client_queues.values())
+
+        if not key_vals and not del_keys:
+            return
+
+        # Send only the latest value of each key modified since the last commit.
+        message = self.ws_server.encode_message(
+            {"update": key_vals, "delete": del_keys}
+        )
+        for send_queue in send_queues:
+            send_queue.put(message)
 
     def on_connect(self, callback_fn):
         self._callback_fns["WebServer.on_connect"] = callback_fn
@@ -225,10 +306,38 @@ class WebServer:
         self.shutdown()
 
     def _initialize_client(self, ws_server, client):
-        self._key_vals.clear()
-        self._del_keys.clear()
-        key_vals = list(iter(self._db.items()))
-        client.send(ws_server.encode_message({"update": key_vals, "delete": []}))
+        # Copy the database and register the client in one step, then let its
+        # sender thread send the copy ahead of any later commits.
+        send_queue = queue.SimpleQueue()
+        with self._lock:
+            key_vals = list(self._db.items())
+            self._client_queues[client] = send_queue
+        sender_thread = threading.Thread(
+            target=self._send_to_client, args=(ws_server, client, key_vals, send_queue)
+        )
+        sender_thread.daemon = True
+        sender_thread.start()
+
+    def _send_to_client(self, ws_server, client, key_vals, send_queue):
+        message = ws_server.encode_message({"update": key_vals, "delete": []})
+        try:
+            while message is not None:
+                client.sendall(message)
+                message = send_queue.get()
+        except OSError:
+            # Client disconnected; stop queueing messages for it.
+            with self._lock:
+                self._client_queues.pop(client, None)
+
+    def _on_client_message(self, ws_server, client, message):
+        if message is not None:
+            return
+
+        # Connection closed: unregister the client and stop its sender thread.
+        with self._lock:
+            send_queue = self._client_queues.pop(client, None)
+        if send_queue is not None:
+            send_queue.put(None)
 
     def shutdown(self):
         self.is_running = False
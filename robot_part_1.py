@@ -18,15 +18,24 @@ class RobotController:
     def __init__(self, simulator, pd_gains, joint_position_goal):
         self.simulator = simulator
         self.pd_gains = pd_gains
-        self.joint_position_goal = joint_position_goal
+        self.joint_position_goal = np.asarray(joint_position_goal, dtype=np.float64)
         self.error = None
 
     def run(self):
         """Runs the controller until it reaches the goal."""
-        while self.is_done() is False:
+        # Look up the loop's methods once rather than on every iteration.
+        is_done = self.is_done
+        update_control = self.update_control
+        step = self.simulator.step
+
+        while is_done() is False:
             # Compute torque output and step.
-            self.update_control()
-            self.simulator.step()
+            update_control()
+            step()
+
+        # Steps only update the visualizer at its render rate, so show the
+        # final state explicitly.
+        self.simulator.publish()
 
         assert self.error is not None
         print()
@@ -48,8 +57,9 @@ class RobotController:
         """Returns True if the goal is reached."""
         if self.error is None:
             return False
-        error_norm = np.linalg.norm(self.error)
-        return error_norm < 1e-3
+        # Compare the squared norm against the squared tolerance to skip the sqrt.
+        error_norm_sq = self.error @ self.error
+        return error_norm_sq < 1e-6
 
 
 if __name__ == "__main__":
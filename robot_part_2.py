@@ -14,7 +14,7 @@ it still doesn't run correctly. Can you find the bugs?
 
 
 from dataclasses import dataclass
-from typing import Optional
+from typing import Callable, Optional
 
 import dcargs
 import numpy as np
@@ -39,6 +39,16 @@ class RobotController:
         self.ee_position_goal: Optional[np.ndarray] = None
         self.error: Optional[np.ndarray] = None
 
+        # Control law for the current goal, selected once in set_goal().
+        self._update_goal_control: Callable[[], None] = self._update_no_control
+
+        # Preallocated buffers for the PD control law.
+        dof = simulator.get_joint_positions().shape[0]
+        self._joint_error = np.empty(dof)
+        self._joint_accelerations = np.empty(dof)
+        self._ee_error = np.empty(3)
+        self._ee_acceleration = np.empty(3)
+
     def set_goal(
         self,
         joint_position_goal: Optional[np.ndarray] = None,
@@ -46,16 +56,30 @@ class RobotController:
     ) -> None:
         """Sets a new joint position or end-effector position goal."""
         if joint_position_goal is not None:
-            self.joint_position_goal = joint_position_goal
+            self.joint_position_goal = np.asarray(joint_position_goal, dtype=np.float64)
         elif ee_position_goal is not None:
-            self.ee_position_goal = ee_position_goal
+            self.ee_position_goal = np.asarray(ee_position_goal, dtype=np.float64)
+
+        if self.joint_position_goal is not None:
+            self._update_goal_control = self._update_joint_control
+        elif self.ee_position_goal is not None:
+            self._update_goal_control = self._update_ee_control
 
     def run(self):
         """Runs the controller until it reaches the goal."""
-        while not self.is_done():
+        # Look up the loop's methods once rather than on every iteration.
+        is_done = self.is_done
+        update_control = self.update_control
+        step = self.simulator.step
+
+        while not is_done():
             # Compute torque output and step.
-            self.update_control()
-            self.simulator.step()
+            update_control()
+            step()
+
+        # Steps only update the visualizer at its render rate, so show the
+        # final state explicitly.
+        self.simulator.publish()
 
         assert self.error is not None
         print()
@@ -64,32 +88,55 @@ class RobotController:
 
     def update_control(self) -> None:
         """Compute PD control output and pass it to the simulator."""
+        self._update_goal_control()
+
+    def _update_no_control(self) -> None:
+        """No goal has been set, so there is nothing to command."""
+
+    def _update_joint_control(self) -> None:
+        """Compute joint space PD control output."""
+        assert self.joint_position_goal is not None
         kp = self.pd_gains.kp
         kd = self.pd_gains.kd
 
-        if self.joint_position_goal is not None:
-            error = self.joint_position_goal - self.simulator.get_joint_positions()
-            velocity = self.simulator.get_joint_velocities()
-            joint_accelerations = kp * error - kd * velocity
-
-            self.simulator.set_joint_accelerations(joint_accelerations)
-            self.error = error
+        error = np.subtract(
+            self.joint_position_goal,
+            self.simulator.get_joint_positions(),
+            out=self._joint_error,
+        )
+        velocity = self.simulator.get_joint_velocities()
+        joint_accelerations = np.multiply(kp, error, out=self._joint_accelerations)
+        joint_accelerations -= kd * velocity
+
+        self.simulator.set_joint_accelerations(joint_accelerations)
+        self.error = error
+
+    def _update_ee_control(self) -> None:
+        """Compute operational space PD control output."""
+        assert self.ee_position_goal is not None
+        kp = self.pd_gains.kp
+        kd = self.pd_gains.kd
 
-        elif self.ee_position_goal is not None:
-            error = self.ee_position_goal - self.simulator.get_ee_position()
-            velocity = self.simulator.get_ee_velocity()
-            ee_acceleration = kp * error - kd * velocity
+        error = np.subtract(
+            self.ee_position_goal,
+            self.simulator.get_ee_position(),
+            out=self._ee_error,
+        )
+        velocity = self.simulator.get_ee_velocity()
+        ee_acceleration = np.multiply(kp, error, out=self._ee_acceleration)
+        ee_acceleration -= kd * velocity
 
-            self.simulator.set_ee_acceleration(ee_acceleration)
-            self.error = error
+        self.simulator.set_ee_acceleration(ee_acceleration)
+        self.error = error
 
     def is_done(self) -> bool:
         """Returns True if the goal is reached."""
         if self.error is None:
             return False
 
-        error_norm = np.linalg.norm(self.error)
-        return bool(error_norm < 1e-3)
+        # Compare the squared norm against the squared tolerance to skip the sqrt.
+        error_norm_sq = self.error @ self.error
+        return bool(error_norm_sq < 1e-6)
 
 
 if __name__ == "__main__":
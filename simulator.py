@@ -5,6 +5,7 @@ improve `robot.py`!"""
 
 import threading
 import time
+from typing import Optional
 
 import ctrlutils  # type: ignore
 import numpy as np
@@ -17,6 +18,7 @@ from redisgl.server import WebServer
 
 class RobotSimulator:
     TIMESTEP = 1 / 1000
+    RENDER_TIMESTEP = 1 / 60
     URDF = "redisgl/web/resources/franka_panda.urdf"
     Q_HOME = np.array([0, -np.pi / 6, 0, -5 * np.pi / 6, 0, 2 * np.pi / 3, np.pi / 4])
     QUAT_HOME = eigen.Quaterniond(w=0, x=1, y=0, z=0) * eigen.Quaterniond(
@@ -33,6 +35,14 @@ class RobotSimulator:
         self.command_tau = np.zeros_like(self.ab.q)
         self.num_iters = 0
 
+        # End-effector kinematics, cached until the next physics step.
+        self._ee_jacobian: Optional[npt.NDArray[np.float64]] = None
+        self._ee_position: Optional[npt.NDArray[np.float64]] = None
+
+        # Real-time pacing: wall-clock deadline of the next step.
+        self._step_deadline: Optional[float] = None
+        self._steps_per_render = max(1, round(self.RENDER_TIMESTEP / self.TIMESTEP))
+
         # Setup robot in Redis.
         # redis.sadd("webapp::resources::simulator", str(path_resources))
         self.model_keys = redisgl.ModelKeys("simulator")
@@ -65,11 +75,15 @@ class RobotSimulator:
 
     def get_ee_position(self) -> npt.NDArray[np.float64]:
         """Get the end-effector position for our robot."""
-        return dyn.cartesian_pose(self.ab, offset=self.EE_OFFSET).translation
+        if self._ee_position is None:
+            self._ee_position = dyn.cartesian_pose(
+                self.ab, offset=self.EE_OFFSET
+            ).translation
+        return self._ee_position
 
     def get_ee_velocity(self) -> npt.NDArray[np.float64]:
         """Get the end-effector velocity for our robot."""
-        return dyn.jacobian(self.ab, offset=self.EE_OFFSET)[:3] @ self.ab.dq
+        return self._get_ee_jacobian()[:3] @ self.ab.dq
 
     def set_joint_accelerations(self, ddq: npt.NDArray[np.float64]) -> None:
         """Set the command joint acceleration."""
@@ -81,7 +95,7 @@ class RobotSimulator:
         KP_JOINT, KV_JOINT = 5, 20
 
         # Decide whether orientation is controllable.
-        J = dyn.jacobian(self.ab, offset=self.EE_OFFSET)
+        J = self._get_ee_jacobian()
         if dyn.opspace.is_singular(self.ab, J, svd_epsilon=0.01):
             # Give up on orientation.
             J = J[:3]
@@ -109,9 +123,31 @@ class RobotSimulator:
     def step(self) -> None:
         """Take one physics simulation step."""
         dyn.integrate(self.ab, self.command_tau, self.TIMESTEP)
-        self._update_redis()
+        self._ee_jacobian = None
+        self._ee_position = None
+
+        # Publish to the visualizer at the render rate, not every physics step.
+        if self.num_iters % self._steps_per_render == 0:
+            self._update_redis()
         self.num_iters += 1
-        time.sleep(self.TIMESTEP)
+
+        # Sleep only for what remains of this step instead of a full timestep.
+        # If we fall more than a frame behind, resync rather than fast-forward:
+        # this step ends now without sleeping, and pacing continues from here.
+        now = time.perf_counter()
+        if (
+            self._step_deadline is None
+            or now - self._step_deadline > self.RENDER_TIMESTEP
+        ):
+            self._step_deadline = now
+            return
+        self._step_deadline += self.TIMESTEP
+        if self._step_deadline > now:
+            time.sleep(self._step_deadline - now)
+
+    def publish(self) -> None:
+        """Send the current robot state to the visualizer immediately."""
+        self._update_redis()
 
     def add_object(self, name: str, position: npt.NDArray[np.float64]) -> None:
         graphics = redisgl.Graphics(name, redisgl.Box(np.array([0.1, 0.1, 0.1])))
@@ -124,6 +160,12 @@ class RobotSimulator:
         )
         self.redis.set_matrix(f"{name}::position", position)
 
+    def _get_ee_jacobian(self) -> npt.NDArray[np.float64]:
+        """Get the end-effector Jacobian, computed at most once per step."""
+        if self._ee_jacobian is None:
+            self._ee_jacobian = dyn.jacobian(self.ab, offset=self.EE_OFFSET)
+        return self._ee_jacobian
+
     def _update_redis(self, commit: bool = True) -> None:
         self.redis.set_matrix(
             "franka_panda::joint_positions", self.get_joint_positions()